@@ -1,20 +1,114 @@
 import asyncio
-import json
 import logging
 import os
-import random
 import time
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 
 import aiofiles
 import aiohttp
 import aiosqlite
+import orjson
+import zstandard as zstd
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
 
+def _extraer_votos_generic(resp):
+    """Sums votes from any of the response shapes the API has returned."""
+    if resp is None:
+        return 0
+
+    if isinstance(resp, (int, float)):
+        return int(resp)
+
+    total = 0
+    if isinstance(resp, list):
+        for item in resp:
+            total += item.get("votos", 0)
+    elif isinstance(resp, dict):
+        # Case: Direct dictionary or with 'resultados' key
+        if "resultados" in resp:
+            for item in resp["resultados"]:
+                total += item.get("votos", 0)
+        elif "votos" in resp:
+            total += resp.get("votos", 0)
+    return total
+
+
+def _sum_votos_fast(resp):
+    """Fast path for the usual {"resultados": [{"votos": n}, ...]} shape."""
+    if resp is None:
+        return 0
+    return sum(item["votos"] for item in resp["resultados"])
+
+
+def extraer_votos(resp):
+    """Total votes in a /votos response; falls back to the generic parser
+    when the payload does not have the expected shape."""
+    try:
+        return _sum_votos_fast(resp)
+    except (KeyError, TypeError, AttributeError):
+        return _extraer_votos_generic(resp)
+
+
+class RateLimiter:
+    """Async token bucket shared by all workers to pace global request rate."""
+
+    def __init__(self, rate, capacity, min_rate=0.5, throttle_cooldown=1.0):
+        self._max_rate = rate  # Target rate, restored gradually after throttling
+        self._min_rate = min_rate
+        self._throttle_cooldown = throttle_cooldown  # Seconds between halvings
+        self._throttled_at = None  # monotonic() time of the last halving
+        self._rate = rate  # Tokens added per second
+        self._capacity = capacity  # Max burst size
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (now - self._updated_at) * self._rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            # Sleep outside the lock so other coroutines can refill/check
+            await asyncio.sleep(wait)
+
+    def throttle(self):
+        """Server pushed back (HTTP 429): halve the rate, at most once per
+        cooldown, so a burst of 429s from requests already in flight counts
+        as a single pushback."""
+        now = time.monotonic()
+        if (
+            self._throttled_at is not None
+            and now - self._throttled_at < self._throttle_cooldown
+        ):
+            return
+        self._throttled_at = now
+        self._rate = max(self._min_rate, self._rate / 2)
+        logging.warning(f"HTTP 429 -> rate limit lowered to {self._rate:.2f} req/s")
+
+    def recover(self):
+        """Successful response: step the rate back up towards the target
+        (not before the cooldown after the last throttle has passed)."""
+        if (
+            self._throttled_at is not None
+            and time.monotonic() - self._throttled_at < self._throttle_cooldown
+        ):
+            return
+        if self._rate < self._max_rate:
+            self._rate = min(self._max_rate, self._rate * 1.1)
+
+
 class CNE_Scraper_Async:
     def __init__(self):
         # --- CONFIGURATION ---
@@ -32,7 +126,23 @@ class CNE_Scraper_Async:
         )
 
         # --- CONCURRENCY ---
-        self.NUM_WORKERS = 4  # Simultaneous workers
+        self.NUM_WORKERS = 24  # Simultaneous workers (matches limit_per_host)
+        self.limiter = RateLimiter(rate=8.0, capacity=16)  # Global requests/sec
+        self.NAV_CONCURRENCY = 12  # Navigation (tree traversal) fetches in flight
+        self._nav_sem = None  # Created in crawl(), inside the running loop
+
+        # --- DATABASE WRITER ---
+        self.DB_BATCH_SIZE = 100  # Rows per COMMIT
+        self.DB_FLUSH_INTERVAL = 0.5  # Max seconds a row waits before COMMIT
+        self.db_conn = None  # Shared aiosqlite connection, opened in main()
+        self.write_queue = None  # Rows pending INSERT, drained by db_writer()
+        self.seen_ids = set()  # id_jrv values already stored in scraped_data
+        self._zstd = zstd.ZstdCompressor(level=6)  # For the json column
+        self.NAV_CACHE_TTL = timedelta(hours=6)  # Navigation responses reuse window
+
+        # --- ASSET DEDUPLICATION ---
+        self._asset_locks: dict[str, asyncio.Event] = {}  # Downloads in flight
+        self._asset_done: set[str] = set()  # Files already on disk
 
         self.setup_logging()
 
@@ -82,47 +192,136 @@ class CNE_Scraper_Async:
 
     async def init_db(self):
         """Initializes the database with WAL mode for high concurrency."""
-        async with aiosqlite.connect(self.db_file) as db:
-            await db.execute("PRAGMA journal_mode=WAL;")
-            await db.execute("PRAGMA synchronous=NORMAL;")
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS scraped_data (
-                    id_jrv INTEGER PRIMARY KEY,
-                    depto_nom TEXT,
-                    muni_nom TEXT,
-                    centro_nom TEXT,
-                    estado_acta TEXT,
-                    votos_validos_calculados INTEGER,
-                    json TEXT,
-                    updated_at TIMESTAMP
-                )
-            """)
-            await db.commit()
-
-    async def verify_db_existance(self, id_jrv):
-        """Quick check (Index Scan) to see if the record already exists."""
-        async with aiosqlite.connect(self.db_file) as db:
-            cursor = await db.execute(
-                "SELECT 1 FROM scraped_data WHERE id_jrv = ?", (id_jrv,)
+        db = self.db_conn
+        await db.execute("PRAGMA journal_mode=WAL;")
+        await db.execute("PRAGMA synchronous=NORMAL;")
+        await db.execute("PRAGMA busy_timeout=30000;")
+        await db.execute("PRAGMA temp_store=MEMORY;")
+        await db.execute("PRAGMA cache_size=-65536;")
+        await db.execute("PRAGMA wal_autocheckpoint=1000;")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS scraped_data (
+                id_jrv INTEGER PRIMARY KEY,
+                depto_nom TEXT,
+                muni_nom TEXT,
+                centro_nom TEXT,
+                estado_acta TEXT,
+                votos_validos_calculados INTEGER,
+                json BLOB,
+                updated_at TIMESTAMP
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS nav_cache (
+                url TEXT PRIMARY KEY,
+                body BLOB,
+                fetched_at TIMESTAMP
             )
-            resultado = await cursor.fetchone()
-            return resultado is not None
+        """)
+        await db.commit()
+        await self.compress_legacy_json()
+
+        # Preload processed JRVs once instead of querying per mesa
+        async with db.execute("SELECT id_jrv FROM scraped_data") as cursor:
+            self.seen_ids = {row[0] for row in await cursor.fetchall()}
+        logging.info(f"JRVs already in DB: {len(self.seen_ids)}")
+
+    async def compress_legacy_json(self):
+        """One-time migration: rows from runs before the json column was
+        compressed hold plain TEXT JSON. Rewrites them as zstd so every row
+        uses the same format (they are in seen_ids and never re-scraped)."""
+        async with self.db_conn.execute(
+            "SELECT id_jrv, json FROM scraped_data WHERE typeof(json) = 'text'"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            return
+        await self.db_conn.executemany(
+            "UPDATE scraped_data SET json = ? WHERE id_jrv = ?",
+            [
+                (self._zstd.compress(text.encode("utf-8")), id_jrv)
+                for id_jrv, text in rows
+            ],
+        )
+        await self.db_conn.commit()
+        logging.info(f"Compressed {len(rows)} legacy TEXT json rows with zstd")
+
+    async def flush_rows(self, batch):
+        """Writes a batch of rows in a single transaction."""
+        if not batch:
+            return
+        try:
+            await self.db_conn.executemany(
+                """
+                INSERT OR REPLACE INTO scraped_data
+                (id_jrv, depto_nom, muni_nom, centro_nom, estado_acta, votos_validos_calculados, json, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                batch,
+            )
+            await self.db_conn.commit()
+        except Exception as e:
+            # Keep the rows: the next flush retries them (INSERT OR REPLACE
+            # makes a partially applied batch safe to write again)
+            logging.error(f"Error DB batch ({len(batch)} JRVs): {e}")
+            return
+        # Only cleared once committed, so a cancelled flush leaves the rows
+        # in place for the final flush in db_writer()
+        self.seen_ids.update(row[0] for row in batch)
+        logging.info(f"DB COMMIT {len(batch)} JRVs")
+        batch.clear()
+
+    async def db_writer(self):
+        """Single consumer of write_queue. Commits every DB_BATCH_SIZE rows
+        or DB_FLUSH_INTERVAL seconds, whichever comes first. A None item stops it."""
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0, deadline - loop.time())
+                try:
+                    row = await asyncio.wait_for(self.write_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    await self.flush_rows(batch)
+                    deadline = None
+                    continue
+
+                if row is None:
+                    break
+                if not batch:
+                    deadline = loop.time() + self.DB_FLUSH_INTERVAL
+                batch.append(row)
+                if len(batch) >= self.DB_BATCH_SIZE:
+                    await self.flush_rows(batch)
+                    deadline = None
+        finally:
+            # Also runs on cancellation (Ctrl+C): pick up rows still waiting
+            # in the queue and shield the last commit from a second cancel
+            while not self.write_queue.empty():
+                row = self.write_queue.get_nowait()
+                if row is not None:
+                    batch.append(row)
+            await asyncio.shield(self.flush_rows(batch))
 
     async def fetch(self, session, method, url, json_payload=None, retries=3):
         """Standard fetch method for data tasks with retry logic."""
         for attempt in range(retries):
             try:
-                # Microscopic jitter to avoid exact network signatures
-                await asyncio.sleep(random.uniform(0.4, 0.8))
+                # Global pacing shared across all workers
+                await self.limiter.acquire()
 
                 if method == "GET":
                     async with session.get(
                         url, headers=self.headers, timeout=15
                     ) as response:
                         if response.status == 200:
-                            return await response.json()
+                            self.limiter.recover()
+                            return orjson.loads(await response.read())
                         elif response.status in [404, 204]:
                             return None
+                        elif response.status == 429:
+                            self.limiter.throttle()
                         else:
                             logging.warning(f"GET {response.status} at {url}")
                 elif method == "POST":
@@ -130,24 +329,75 @@ class CNE_Scraper_Async:
                         url, json=json_payload, headers=self.headers, timeout=15
                     ) as response:
                         if response.status == 200:
-                            return await response.json()
+                            self.limiter.recover()
+                            return orjson.loads(await response.read())
                         # Note: Sometimes POST returns 204 if no data, treat as None
                         elif response.status == 204:
                             return None
+                        elif response.status == 429:
+                            self.limiter.throttle()
                         else:
                             logging.warning(f"POST {response.status} at {url}")
             except Exception as e:
                 logging.error(f"Error {method} {url} (Attempt {attempt + 1}): {e}")
-                await asyncio.sleep(1 * (attempt + 1))
+
+            # Exponential backoff, only between failed attempts
+            if attempt < retries - 1:
+                await asyncio.sleep(2**attempt)
         return None
 
-    async def fetch_navigation_robust(self, session, url, context_msg):
-        """Specialized fetch for navigation (Departments/Municipalities)."""
+    async def nav_cache_get(self, url):
+        """Returns the cached navigation response for url, or None if stale/missing."""
+        cutoff = (datetime.now() - self.NAV_CACHE_TTL).isoformat()
+        async with self.db_conn.execute(
+            "SELECT body FROM nav_cache WHERE url = ? AND fetched_at > ?",
+            (url, cutoff),
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return orjson.loads(zlib.decompress(row[0]))
+
+    async def nav_cache_put(self, url, data):
+        """Stores a navigation response compressed with zlib."""
+        body = zlib.compress(orjson.dumps(data))
+        await self.db_conn.execute(
+            "INSERT OR REPLACE INTO nav_cache (url, body, fetched_at) VALUES (?, ?, ?)",
+            (url, body, datetime.now().isoformat()),
+        )
+        await self.db_conn.commit()
+
+    async def fetch_navigation_robust(self, session, url, context_msg, cache=True):
+        """Specialized fetch for navigation (Departments/Municipalities).
+        cache=False bypasses nav_cache, for responses that must stay fresh."""
+        if cache:
+            try:
+                cached = await self.nav_cache_get(url)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logging.error(f"Navigation cache read failed {context_msg}: {e}")
+
+        # Bounded so the traversal does not park one coroutine per centro in
+        # the rate limiter and starve the mesa workers of tokens
+        async with self._nav_sem:
+            return await self._fetch_navigation(session, url, context_msg, cache)
+
+    async def _fetch_navigation(self, session, url, context_msg, cache):
         max_retries = 5
         for attempt in range(max_retries):
             try:
                 data = await self.fetch(session, "GET", url, retries=1)
                 if data is not None:
+                    # An empty list may be a transient blip: don't let it hide
+                    # the branch for NAV_CACHE_TTL, refetch it next run
+                    if cache and data:
+                        try:
+                            await self.nav_cache_put(url, data)
+                        except Exception as e:
+                            logging.error(
+                                f"Navigation cache write failed {context_msg}: {e}"
+                            )
                     return data
                 logging.warning(
                     f"Empty navigation at {context_msg} (Attempt {attempt + 1}/{max_retries})"
@@ -160,11 +410,32 @@ class CNE_Scraper_Async:
         return []
 
     async def descargar_asset(self, session, url, folder, filename):
-        """Downloads a file (image/pdf) to the specified folder."""
+        """Downloads a file (image/pdf) to the specified folder.
+        Each file is downloaded at most once per run: concurrent callers for
+        the same file wait for the first download instead of repeating it."""
         if not url:
             return None
         full_path = os.path.join(folder, filename)
 
+        if full_path in self._asset_done:
+            return filename
+        if full_path in self._asset_locks:
+            await self._asset_locks[full_path].wait()
+            return filename if full_path in self._asset_done else None
+
+        event = asyncio.Event()
+        self._asset_locks[full_path] = event
+        try:
+            result = await self._download_asset(session, url, full_path, filename)
+            if result is not None:
+                self._asset_done.add(full_path)
+            return result
+        finally:
+            # Drop the lock so a failed download can be retried by a later mesa
+            del self._asset_locks[full_path]
+            event.set()
+
+    async def _download_asset(self, session, url, full_path, filename):
         # Skip if file exists and is not empty
         if os.path.exists(full_path) and os.path.getsize(full_path) > 0:
             return filename
@@ -179,87 +450,44 @@ class CNE_Scraper_Async:
             return None
         return None
 
-    async def procesar_mesa_task(self, session, mesa, ids_geo, noms_geo):
-        """Main processing logic for a single polling station (Mesa/JRV)."""
+    async def procesar_mesa_task(
+        self, session, mesa, ids_geo, noms_geo, payload_centro
+    ):
+        """Main processing logic for a single polling station (Mesa/JRV).
+        payload_centro holds the request fields shared by every mesa of the centro."""
         id_jrv = mesa.get("numero") or mesa.get("jrv")
         if not id_jrv:
             return
         id_str = str(id_jrv)
 
         # Skip if already in DB
-        if await self.verify_db_existance(int(id_str)):
+        if int(id_str) in self.seen_ids:
             return
 
-        # Prepare Base Payload
-        payload_base = {
-            "codigos": [],
-            "tipco": self.NIVEL,
-            "mesa": int(id_str),
-            "depto": ids_geo["depto"],
-            "mcpio": ids_geo["muni"],
-            "zona": ids_geo["zona"],
-            "pesto": ids_geo["centro"],
-            "comuna": "00",
-        }
-
-        # Specific Payloads
-        payload_blancos = payload_base.copy()
-        payload_blancos["codigos"] = ["996"]
-
-        payload_nulos = payload_base.copy()
-        payload_nulos["codigos"] = ["997", "998"]
-
-        # --- CRITICAL FIX: PARTIAL SEQUENTIALITY ---
-        # Separate requests to avoid saturating the server with simultaneous hits.
+        # Prepare Payloads (only "mesa" and "codigos" vary per request)
+        payload_base = {**payload_centro, "mesa": int(id_str)}
+        payload_blancos = {**payload_base, "codigos": ["996"]}
+        payload_nulos = {**payload_base, "codigos": ["997", "998"]}
 
-        # Group 1: Main Data (Parallel)
-        urls_main = [
+        # All 5 POSTs in one batch; the connector pool and the global
+        # rate limiter take care of not saturating the server.
+        urls = [
             (f"{self.BASE_API}/presentacion-resultados/actas-validas", payload_base),
             (f"{self.BASE_API}/presentacion-resultados/sufragantes", payload_base),
             (f"{self.BASE_API}/presentacion-resultados", payload_base),
+            (self.URL_VOTOS, payload_blancos),
+            (self.URL_VOTOS, payload_nulos),
         ]
-        resps_main = await asyncio.gather(
-            *[self.fetch(session, "POST", u, p) for u, p in urls_main]
-        )
-        data_val, data_suf, data_res = resps_main
-
-        # Short pause before requesting special votes
-        await asyncio.sleep(0.1)
-
-        # Group 2: Blank Votes (Individual)
-        data_blancos = await self.fetch(
-            session, "POST", self.URL_VOTOS, payload_blancos
+        data_val, data_suf, data_res, data_blancos, data_nulos = await asyncio.gather(
+            *[self.fetch(session, "POST", u, p) for u, p in urls]
         )
 
-        # Group 3: Null Votes (Individual)
-        data_nulos = await self.fetch(session, "POST", self.URL_VOTOS, payload_nulos)
-
         # Validation checks
         data_val = data_val or {}
         data_suf = data_suf or {}
         data_res = data_res or {}
 
         # Process Special Votes
-        def extraer_votos(resp):
-            if resp is None:
-                return 0
-
-            if isinstance(resp, (int, float)):
-                return int(resp)
-
-            total = 0
-            if isinstance(resp, list):
-                for item in resp:
-                    total += item.get("votos", 0)
-            elif isinstance(resp, dict):
-                # Case: Direct dictionary or with 'resultados' key
-                if "resultados" in resp:
-                    for item in resp["resultados"]:
-                        total += item.get("votos", 0)
-                elif "votos" in resp:
-                    total += resp.get("votos", 0)
-            return total
-
         votos_blancos = extraer_votos(data_blancos)
         votos_nulos = extraer_votos(data_nulos)
 
@@ -315,15 +543,18 @@ class CNE_Scraper_Async:
         if url_pdf:
             pdf_name = f"HND_2025_JRV_{int(id_str):05d}.pdf"
             # Save PDF to 'scans/pdf' directory
-            await self.descargar_asset(session, url_pdf, self.pdf_dir, pdf_name)
-            if os.path.exists(os.path.join(self.pdf_dir, pdf_name)):
-                pdf_local = pdf_name
+            pdf_local = await self.descargar_asset(
+                session, url_pdf, self.pdf_dir, pdf_name
+            )
+
+        # One clock read per mesa, shared by the JSON and the DB row
+        now = datetime.now()
 
         # Construct Final JSON
         json_final = {
             "id_jrv": int(id_str),
             "timestamps": {
-                "extraccion_local": datetime.now().isoformat(),
+                "extraccion_local": now.isoformat(),
                 "corte_servidor": data_res.get("fecha_corte"),
             },
             "geografia": {
@@ -364,39 +595,28 @@ class CNE_Scraper_Async:
             },
         }
 
-        # Save to Database
-        try:
-            async with aiosqlite.connect(self.db_file) as db:
-                await db.execute(
-                    """
-                    INSERT OR REPLACE INTO scraped_data 
-                    (id_jrv, depto_nom, muni_nom, centro_nom, estado_acta, votos_validos_calculados, json, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        int(id_str),
-                        noms_geo["depto"],
-                        noms_geo["muni"],
-                        noms_geo["centro"],
-                        json_final["auditoria"]["estado_global"],
-                        total_validos,
-                        json.dumps(json_final, ensure_ascii=False),
-                        datetime.now(),
-                    ),
-                )
-                await db.commit()
-            logging.info(f"OK JRV {id_str})")
-        except Exception as e:
-            logging.error(f"Error DB JRV {id_str}: {e}")
+        # Queue for the batched DB writer
+        await self.write_queue.put(
+            (
+                int(id_str),
+                noms_geo["depto"],
+                noms_geo["muni"],
+                noms_geo["centro"],
+                json_final["auditoria"]["estado_global"],
+                total_validos,
+                # zstd-compressed UTF-8 JSON (see README for decoding)
+                self._zstd.compress(orjson.dumps(json_final)),
+                # Same text the sqlite3 datetime adapter produced, minus the adapter
+                now.isoformat(" "),
+            )
+        )
+        logging.info(f"OK JRV {id_str})")
 
     async def worker(self, queue, session):
         while True:
             try:
                 item = await queue.get()
-                mesa, ids_geo, noms_geo = item
-                # Random pause to avoid blocking
-                await asyncio.sleep(random.uniform(0.5, 1.5))
-                await self.procesar_mesa_task(session, mesa, ids_geo, noms_geo)
+                await self.procesar_mesa_task(session, *item)
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -404,12 +624,144 @@ class CNE_Scraper_Async:
             finally:
                 queue.task_done()
 
+    async def process_depto(self, session, queue, depto):
+        """Fetches the municipalities of a department and walks them concurrently."""
+        url_munis = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/municipios"
+        munis = await self.fetch_navigation_robust(
+            session, url_munis, f"Municipalities of {depto['nombre']}"
+        )
+        print(f"Processing Department: {depto['nombre']}")
+
+        await asyncio.gather(
+            *[self.process_muni(session, queue, depto, muni) for muni in munis]
+        )
+
+    async def process_muni(self, session, queue, depto, muni):
+        """Fetches the zones of a municipality and walks them concurrently."""
+        id_muni = muni["id_municipio"]
+        nom_muni = muni["municipio"]
+
+        url_zonas = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/00/zonas"
+        zonas = await self.fetch_navigation_robust(
+            session, url_zonas, f"Zones of {nom_muni}"
+        )
+        print(
+            f"Processing Department: {depto['nombre']} Municipality: {muni['municipio']}"
+        )
+
+        MAPA_ZONAS_DEFAULT = {"01": "URBANA", "02": "RURAL"}
+
+        tasks = []
+        for zona in zonas:
+            id_zona = zona.get("cod_zona") or zona.get("id_zona")
+            nom_zona = zona.get("zona") or MAPA_ZONAS_DEFAULT.get(
+                id_zona, "Desconocida"
+            )
+            tasks.append(
+                self.process_zona(
+                    session, queue, depto, id_muni, nom_muni, id_zona, nom_zona
+                )
+            )
+        await asyncio.gather(*tasks)
+
+    async def process_zona(
+        self, session, queue, depto, id_muni, nom_muni, id_zona, nom_zona
+    ):
+        """Fetches the voting centers of a zone and walks them concurrently."""
+        url_centros = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/{id_zona}/puestos"
+        centros = await self.fetch_navigation_robust(
+            session, url_centros, f"Centers in {nom_zona}"
+        )
+
+        await asyncio.gather(
+            *[
+                self.process_centro(
+                    session, queue, depto, id_muni, nom_muni, id_zona, nom_zona, centro
+                )
+                for centro in centros
+            ]
+        )
+
+    async def process_centro(
+        self, session, queue, depto, id_muni, nom_muni, id_zona, nom_zona, centro
+    ):
+        """Fetches the mesas of a voting center and queues the pending ones."""
+        id_centro = centro["id_puesto"]
+        nom_centro = centro["puesto"]
+
+        url_mesas = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/{id_zona}/{id_centro}/mesas"
+        # Not cached: each mesa carries a tokenized PDF URL (nombre_archivo)
+        # that expires, and a stale one would mark the PDF as never downloaded
+        mesas = await self.fetch_navigation_robust(
+            session, url_mesas, f"Polling Stations in {nom_centro}", cache=False
+        )
+
+        # Shared by every mesa of this centro
+        ids_geo = {
+            "depto": depto["id"],
+            "muni": id_muni,
+            "zona": id_zona,
+            "centro": id_centro,
+        }
+        noms_geo = {
+            "depto": depto["nombre"],
+            "muni": nom_muni,
+            "centro": nom_centro,
+            "zona": nom_zona,
+        }
+        payload_centro = {
+            "codigos": [],
+            "tipco": self.NIVEL,
+            "depto": depto["id"],
+            "mcpio": id_muni,
+            "zona": id_zona,
+            "pesto": id_centro,
+            "comuna": "00",
+        }
+
+        for mesa in mesas:
+            id_jrv = mesa.get("numero") or mesa.get("jrv")
+
+            if id_jrv and int(id_jrv) in self.seen_ids:
+                continue
+
+            await queue.put((mesa, ids_geo, noms_geo, payload_centro))
+
     async def main(self):
-        await self.init_db()
+        # Single long-lived connection shared by the whole run
+        self.db_conn = await aiosqlite.connect(self.db_file)
+        try:
+            await self.init_db()
+            self.write_queue = asyncio.Queue()
+            writer_task = asyncio.create_task(self.db_writer())
+            try:
+                await self.crawl()
+                await self.write_queue.put(None)
+                await writer_task
+            finally:
+                # Stop the writer with the sentinel rather than cancel(): it
+                # then writes every queued row before exiting. (A cancel can
+                # also be swallowed by wait_for when a row arrives at the
+                # same moment, leaving the writer running.)
+                if not writer_task.done():
+                    self.write_queue.put_nowait(None)
+                await asyncio.gather(writer_task, return_exceptions=True)
+        finally:
+            await self.db_conn.close()
+
+    async def crawl(self):
+        """Walks the department hierarchy and feeds mesas to the workers."""
         queue = asyncio.Queue(maxsize=1000)
-
-        # Limit HTTP/2 connections
-        conn = aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300)
+        self._nav_sem = asyncio.Semaphore(self.NAV_CONCURRENCY)
+
+        # Pooled keep-alive connections; the global rate limiter controls QPS
+        conn = aiohttp.TCPConnector(
+            limit=64,
+            limit_per_host=24,
+            ttl_dns_cache=600,
+            enable_cleanup_closed=True,
+            keepalive_timeout=60,
+        )
 
         timeout_config = aiohttp.ClientTimeout(total=30, connect=10)
 
@@ -445,69 +797,11 @@ class CNE_Scraper_Async:
                 {"id": "20", "nombre": "Voto_Exterior"},
             ]
 
-            for depto in deptos_list:
-                url_munis = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/municipios"
-                munis = await self.fetch_navigation_robust(
-                    session, url_munis, f"Municipalities of {depto['nombre']}"
-                )
-                print(f"Processing Department: {depto['nombre']}")
-
-                for muni in munis:
-                    id_muni = muni["id_municipio"]
-                    nom_muni = muni["municipio"]
-
-                    url_zonas = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/00/zonas"
-                    zonas = await self.fetch_navigation_robust(
-                        session, url_zonas, f"Zones of {nom_muni}"
-                    )
-                    print(
-                        f"Processing Department: {depto['nombre']} Municipality: {muni['municipio']}"
-                    )
-
-                    MAPA_ZONAS_DEFAULT = {"01": "URBANA", "02": "RURAL"}
-
-                    for zona in zonas:
-                        id_zona = zona.get("cod_zona") or zona.get("id_zona")
-                        nom_zona = zona.get("zona") or MAPA_ZONAS_DEFAULT.get(
-                            id_zona, "Desconocida"
-                        )
-
-                        url_centros = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/{id_zona}/puestos"
-                        centros = await self.fetch_navigation_robust(
-                            session, url_centros, f"Centers in {nom_zona}"
-                        )
-
-                        for centro in centros:
-                            id_centro = centro["id_puesto"]
-                            nom_centro = centro["puesto"]
-
-                            url_mesas = f"{self.BASE_API}/actas-documentos/{self.NIVEL}/{depto['id']}/{id_muni}/{id_zona}/{id_centro}/mesas"
-                            mesas = await self.fetch_navigation_robust(
-                                session, url_mesas, f"Polling Stations in {nom_centro}"
-                            )
-
-                            for mesa in mesas:
-                                id_jrv = mesa.get("numero") or mesa.get("jrv")
-
-                                if id_jrv and await self.verify_db_existance(
-                                    int(id_jrv)
-                                ):
-                                    continue
-
-                                ids_geo = {
-                                    "depto": depto["id"],
-                                    "muni": id_muni,
-                                    "zona": id_zona,
-                                    "centro": id_centro,
-                                }
-                                noms_geo = {
-                                    "depto": depto["nombre"],
-                                    "muni": nom_muni,
-                                    "centro": nom_centro,
-                                    "zona": nom_zona,
-                                }
-
-                                await queue.put((mesa, ids_geo, noms_geo))
+            # Fan out the whole tree; _nav_sem bounds the navigation requests
+            # in flight and workers start on mesas as soon as they are discovered
+            await asyncio.gather(
+                *[self.process_depto(session, queue, depto) for depto in deptos_list]
+            )
 
             print("Hierarchy traversed. Processing job queue...")
             await queue.join()
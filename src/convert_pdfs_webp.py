@@ -1,13 +1,12 @@
+import argparse
 import logging
 import os
-import shutil
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from concurrent.futures._base import Future
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from pathlib import Path
+from typing import Optional
 
-from pdf2image import convert_from_path
-from PIL import Image
+import pypdfium2 as pdfium
 from tqdm import tqdm
 
 # Setup logging
@@ -17,55 +16,94 @@ logging.basicConfig(
 logger: logging.Logger = logging.getLogger(__name__)
 
 
+def _webp_quality(quality: Optional[int], lossless: bool) -> int:
+    """
+    Quality passed to Pillow. Unset, it is 85 for lossy output and 100 for
+    lossless, where Pillow reads it as compression effort (matching the old
+    lossless=True, quality=100 output).
+    """
+    if quality is not None:
+        return quality
+    return 100 if lossless else 85
+
+
+def _is_converted(path: Path) -> bool:
+    """True if the output image exists and is not empty."""
+    return path.exists() and path.stat().st_size > 0
+
+
 def convert_single_pdf(
     pdf_path: Path,
     output_root: Path,
-    temp_root: Path,
     dpi: int = 300,
     fmt: str = "webp",
+    quality: Optional[int] = None,
+    lossless: bool = False,
 ) -> str:
     """
     Converts a single PDF. Returns the pdf name for logging.
     If the PDF has only one page, it keeps the original filename.
+    Pages are rendered in-process with pdfium, straight into PIL images.
     """
     base_name = pdf_path.stem
 
-    # Create unique temp dir for THIS process
-    pdf_temp_dir = temp_root / f"{base_name}_{os.getpid()}"
-    pdf_temp_dir.mkdir(parents=True, exist_ok=True)
+    # Re-runs: single-page outputs keep the PDF name, so a finished scan
+    # can be detected without opening the PDF at all
+    if _is_converted(output_root / f"{base_name}.{fmt}"):
+        return f"SKIP: {base_name}"
 
     try:
-        # NOTE: thread_count is set to 1 here because we are parallelizing
-        # at the FILE level, not the PAGE level.
-        page_paths = convert_from_path(
-            str(pdf_path),
-            dpi=dpi,
-            output_folder=pdf_temp_dir,
-            thread_count=1,
-            fmt="ppm",
-            paths_only=True,
-        )
-
-        num_pages: int = len(page_paths)
-
-        for i, page_temp_path in enumerate(page_paths):
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            num_pages: int = len(pdf)
+
             # Check if it's a single page to determine naming convention
             if num_pages == 1:
-                final_name: str = f"{base_name}.{fmt}"
+                final_paths = [output_root / f"{base_name}.{fmt}"]
             else:
-                final_name: str = f"{base_name}_page_{i + 1:02d}.{fmt}"
-
-            final_path: Path = output_root / final_name
-
-            if final_path.exists():
-                continue
-
-            with Image.open(page_temp_path) as img:
-                if fmt == "webp":
-                    # Lossless high-quality settings for webp
-                    img.save(final_path, format=fmt, lossless=True, quality=100)
-                else:
-                    img.save(final_path, format=fmt)
+                final_paths = [
+                    output_root / f"{base_name}_page_{i + 1:02d}.{fmt}"
+                    for i in range(num_pages)
+                ]
+
+            pending = [
+                (i, path)
+                for i, path in enumerate(final_paths)
+                if not _is_converted(path)
+            ]
+            if not pending:
+                return f"SKIP: {base_name}"
+
+            for i, final_path in pending:
+                page = pdf[i]
+                try:
+                    img = page.render(scale=dpi / 72).to_pil()
+                finally:
+                    page.close()
+
+                # Encode to a temp file and rename it into place, so an
+                # interrupted run never leaves a truncated image that
+                # _is_converted would then skip forever
+                tmp_path = final_path.with_suffix(".tmp")
+                try:
+                    if fmt == "webp":
+                        # Lossy q=85 is visually identical on scans and much
+                        # smaller; method=6 trades encode time for the best
+                        # compression
+                        img.save(
+                            tmp_path,
+                            format=fmt,
+                            quality=_webp_quality(quality, lossless),
+                            lossless=lossless,
+                            method=6,
+                        )
+                    else:
+                        img.save(tmp_path, format=fmt)
+                    os.replace(tmp_path, final_path)
+                finally:
+                    tmp_path.unlink(missing_ok=True)
+        finally:
+            pdf.close()
 
         return f"SUCCESS: {base_name}"
 
@@ -73,17 +111,17 @@ def convert_single_pdf(
         logger.error(f"Failed to convert {pdf_path.name}: {e}")
         return f"ERROR: {base_name}"
 
-    finally:
-        if pdf_temp_dir.exists():
-            shutil.rmtree(pdf_temp_dir)
-
 
 def process_batch_parallel(
-    input_dir: Path, output_dir: Path, dpi: int = 300, output_format: str = "webp"
+    input_dir: Path,
+    output_dir: Path,
+    dpi: int = 300,
+    output_format: str = "webp",
+    quality: Optional[int] = None,
+    lossless: bool = False,
 ) -> None:
     input_dir = Path(input_dir)
     output_dir = Path(output_dir)
-    temp_dir: Path = output_dir.parent / ".temp_conversion_buffer"
     output_dir.mkdir(parents=True, exist_ok=True)
 
     pdf_files: list[Path] = list(input_dir.glob("*.pdf"))
@@ -91,36 +129,44 @@ def process_batch_parallel(
         logger.warning(f"No PDF files found in {input_dir}")
         return
 
-    # Optimization for Ryzen 9 5900X (12 Cores / 24 Threads)
-    max_workers = 20
+    # One process per core; rendering is CPU-bound
+    max_workers = max(1, os.cpu_count() or 4)
 
     logger.info(f"Processing {len(pdf_files)} PDFs with {max_workers} processes...")
 
     worker_func: partial[str] = partial(
         convert_single_pdf,
         output_root=output_dir,
-        temp_root=temp_dir,
         dpi=dpi,
         fmt=output_format,
+        quality=quality,
+        lossless=lossless,
     )
 
     with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures: list[Future[str]] = [
-            executor.submit(worker_func, pdf) for pdf in pdf_files
-        ]
-        for future in tqdm(
-            as_completed(futures), total=len(pdf_files), desc="Converting PDFs"
-        ):
-            # Results are processed as they complete
+        # convert_single_pdf catches its own errors, so map never aborts early
+        results = executor.map(worker_func, pdf_files, chunksize=8)
+        for result in tqdm(results, total=len(pdf_files), desc="Converting PDFs"):
+            # Results are streamed back in submission order
             pass
 
-    # Cleanup main temp buffer
-    if temp_dir.exists():
-        shutil.rmtree(temp_dir)
     logger.info(f"Batch processing complete. Output: {output_dir}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert scanned PDFs to images.")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=None,
+        help="WebP quality (0-100); default 85, or 100 with --lossless",
+    )
+    parser.add_argument(
+        "--lossless", action="store_true", help="Use lossless WebP encoding"
+    )
+    args = parser.parse_args()
+
     BASE_DIR = Path(__file__).resolve().parent.parent
     INPUT_DIR = BASE_DIR / "assets" / "scans" / "pdf"
     OUTPUT_DIR = BASE_DIR / "assets" / "scans" / "webp"
@@ -129,4 +175,11 @@ if __name__ == "__main__":
     print(f"Outputting WebP to: {OUTPUT_DIR}")
 
     # Run the parallel version
-    process_batch_parallel(INPUT_DIR, OUTPUT_DIR, dpi=300, output_format="webp")
+    process_batch_parallel(
+        INPUT_DIR,
+        OUTPUT_DIR,
+        dpi=args.dpi,
+        output_format="webp",
+        quality=args.quality,
+        lossless=args.lossless,
+    )
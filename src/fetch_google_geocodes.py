@@ -1,10 +1,10 @@
-import json
+import asyncio
 import os
 import sqlite3
-import time
 from pathlib import Path
 
-import googlemaps
+import aiohttp
+import orjson
 import pandas as pd
 from dotenv import load_dotenv
 from tqdm import tqdm
@@ -15,7 +15,17 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 INPUT_FILE: Path = ROOT_DIR / "data" / "voting_centers.csv"
 DB_FILE: Path = ROOT_DIR / "data" / "databases" / "google_geocoding.db"
 TABLE_NAME = "raw_responses"
+CHECKPOINT_FILE: Path = DB_FILE.parent / ".geocode_checkpoint.json"
 COUNTRY_MAP: dict[str, str] = {"HND": "HN", "USA": "US"}
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+MAX_CONCURRENCY = 10  # Simultaneous requests to the Geocoding API
+CHUNK_SIZE = 500  # Rows scheduled per round
+DB_BATCH_SIZE = 200  # Rows per COMMIT
+MAX_ATTEMPTS = 5  # ERROR rows are retried (with backoff) up to this many times
+MAX_QPS = 50  # Request pacing, same default cap as the googlemaps client
+REQUEST_RETRIES = 3  # In-run attempts per query for transient failures
+RETRY_HTTP_STATUSES = {429, 500, 502, 503, 504}
+RETRY_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
 
 # Load Environment Variables
 load_dotenv()
@@ -24,14 +34,14 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 if not API_KEY:
     raise ValueError("No API Key found. Please check your .env file.")
 
-# Initialize Client
-gmaps = googlemaps.Client(key=API_KEY)
-
 
 def setup_database():
     """Creates the SQLite table if it doesn't exist."""
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute("PRAGMA busy_timeout=30000")
 
     c.execute(f"""
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
@@ -39,28 +49,190 @@ def setup_database():
             geo_query TEXT,
             full_response JSON,
             status TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            attempts INTEGER DEFAULT 0,
+            next_retry_at TIMESTAMP
         )
     """)
+
+    # Migrate databases created before retry tracking existed
+    columns = {row[1] for row in c.execute(f"PRAGMA table_info({TABLE_NAME})")}
+    if "attempts" not in columns:
+        c.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN attempts INTEGER DEFAULT 0")
+    if "next_retry_at" not in columns:
+        c.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN next_retry_at TIMESTAMP")
+
     conn.commit()
     return conn
 
 
 def get_existing_ids(conn):
-    """Returns a set of center_ids that are already in the database."""
-    c = conn.cursor()
-    c.execute(f"SELECT center_id FROM {TABLE_NAME}")
-    return set(row[0] for row in c.fetchall())
+    """Returns a Series of center_ids that should not be fetched again:
+    finished rows, plus ERROR rows that are exhausted or still backing off."""
+    query = f"""
+        SELECT center_id FROM {TABLE_NAME}
+        WHERE status != 'ERROR'
+           OR attempts >= ?
+           OR next_retry_at > datetime('now')
+    """
+    return pd.read_sql(query, conn, params=(MAX_ATTEMPTS,))["center_id"]
 
 
-def save_to_db(conn, center_id, geo_query, response, status):
-    """Inserts a new record into the database."""
+def save_batch(conn, rows):
+    """Inserts a batch of (center_id, geo_query, full_response, status) rows
+    in a single transaction and empties the list."""
+    if not rows:
+        return
     c = conn.cursor()
-    c.execute(
-        f"INSERT INTO {TABLE_NAME} (center_id, geo_query, full_response, status) VALUES (?, ?, ?, ?)",
-        (str(center_id), geo_query, json.dumps(response), status),
+    # ERROR rows get next_retry_at = now + 2^attempts minutes
+    c.executemany(
+        f"""
+        INSERT INTO {TABLE_NAME}
+            (center_id, geo_query, full_response, status, attempts, next_retry_at)
+        VALUES (?1, ?2, ?3, ?4, 1,
+            CASE WHEN ?4 = 'ERROR' THEN datetime('now', '+2 minutes') END)
+        ON CONFLICT(center_id) DO UPDATE SET
+            geo_query = excluded.geo_query,
+            full_response = excluded.full_response,
+            status = excluded.status,
+            timestamp = CURRENT_TIMESTAMP,
+            attempts = attempts + 1,
+            next_retry_at = CASE WHEN excluded.status = 'ERROR'
+                THEN datetime('now', '+' || (1 << (attempts + 1)) || ' minutes')
+            END
+        """,
+        rows,
     )
     conn.commit()
+    rows.clear()
+
+
+def load_checkpoint():
+    """Returns the progress saved by an interrupted run, or a fresh state."""
+    try:
+        return orjson.loads(CHECKPOINT_FILE.read_bytes())
+    except FileNotFoundError:
+        return {"last_index": 0, "processed_count": 0}
+
+
+def save_checkpoint(last_index, processed_count):
+    """Records progress after a committed chunk (atomic via rename)."""
+    tmp_file = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp_file.write_bytes(
+        orjson.dumps({"last_index": last_index, "processed_count": processed_count})
+    )
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+
+class GeocodeError(Exception):
+    """Failed geocoding request. The message never includes the request URL,
+    which carries the API key."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+_next_request_at = 0.0
+
+
+async def _pace():
+    """Spaces request starts at least 1 / MAX_QPS seconds apart."""
+    global _next_request_at
+    now = asyncio.get_running_loop().time()
+    wait = _next_request_at - now
+    _next_request_at = max(now, _next_request_at) + 1 / MAX_QPS
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+async def _geocode_once(session, sem, params):
+    async with sem:
+        await _pace()
+        try:
+            async with session.get(GEOCODE_URL, params=params) as r:
+                if r.status != 200:
+                    raise GeocodeError(
+                        f"HTTP {r.status}", retryable=r.status in RETRY_HTTP_STATUSES
+                    )
+                body = orjson.loads(await r.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Only the type: aiohttp error messages can include the URL
+            raise GeocodeError(type(e).__name__, retryable=True) from None
+
+    # OVER_QUERY_LIMIT, REQUEST_DENIED, etc. are errors, not empty results
+    status = body.get("status")
+    if status not in ("OK", "ZERO_RESULTS"):
+        raise GeocodeError(
+            f"{status} {body.get('error_message', '')}".strip(),
+            retryable=status in RETRY_API_STATUSES,
+        )
+    return body.get("results", [])
+
+
+async def geocode(session, sem, address, country_filter):
+    """Calls the Geocoding REST endpoint and returns its list of results.
+    Rate limits, 5xx and network errors are retried with backoff."""
+    params = {
+        "address": address,
+        "components": f"country:{country_filter}",
+        "key": API_KEY,
+    }
+    for attempt in range(REQUEST_RETRIES):
+        try:
+            return await _geocode_once(session, sem, params)
+        except GeocodeError as e:
+            if not e.retryable or attempt == REQUEST_RETRIES - 1:
+                raise
+        # Back off outside the semaphore so other queries keep going
+        await asyncio.sleep(2**attempt)
+
+
+async def fetch_row(session, sem, pbar, center_id, address, iso3):
+    """Geocodes a single voting center and returns the row to insert."""
+    country_filter = COUNTRY_MAP.get(iso3, "HN")
+    try:
+        response = await geocode(session, sem, address, country_filter)
+        status = "OK" if response else "ZERO_RESULTS"
+    except Exception as e:
+        # GeocodeError messages are safe to show; for anything else, the type
+        reason = e if isinstance(e, GeocodeError) else type(e).__name__
+        print(f"Error on {center_id}: {reason}")
+        # Saved as ERROR; retried on later runs with backoff, up to MAX_ATTEMPTS
+        response, status = [], "ERROR"
+    finally:
+        pbar.update(1)
+    return (str(center_id), address, orjson.dumps(response).decode(), status)
+
+
+async def fetch_all(conn, rows, processed_count=0):
+    """Geocodes rows concurrently, committing results every DB_BATCH_SIZE rows.
+    Rows are (input_index, center_id, geo_query, country_code) tuples; a
+    checkpoint is written once every row of a chunk is committed."""
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    batch = []
+
+    async with aiohttp.ClientSession() as session:
+        with tqdm(total=len(rows), desc="Fetching Geocodes") as pbar:
+            try:
+                for start in range(0, len(rows), CHUNK_SIZE):
+                    chunk = rows[start : start + CHUNK_SIZE]
+                    tasks = [fetch_row(session, sem, pbar, *row[1:]) for row in chunk]
+                    for next_done in asyncio.as_completed(tasks):
+                        result = await next_done
+                        batch.append(result)
+                        if result[3] != "ERROR":
+                            processed_count += 1
+                        if len(batch) >= DB_BATCH_SIZE:
+                            save_batch(conn, batch)
+
+                    save_batch(conn, batch)
+                    save_checkpoint(chunk[-1][0] + 1, processed_count)
+            finally:
+                # Persist whatever finished, also on Ctrl+C
+                save_batch(conn, batch)
+
+    return processed_count
 
 
 def run_fetcher():
@@ -75,35 +247,32 @@ def run_fetcher():
     print(f"Total rows to process: {len(df)}")
     print(f"Already cached: {len(existing_ids)}")
 
-    # 3. Iterate
-    processed_count = 0
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc="Fetching Geocodes"):
-        center_id = row["voting_center_id"]
-        address = row["geo_query"]
-        iso3 = row.get("country_code", "HND")
-        country_filter = COUNTRY_MAP.get(iso3, "HN")
+    # 3. Pending work: anti-join against what is already in the DB
+    todo = df[~df["voting_center_id"].isin(existing_ids)]
+    if "country_code" not in todo.columns:
+        todo = todo.assign(country_code="HND")
+    print(f"Skipping {len(df) - len(todo)} rows already in DB")
 
-        # Skip if already in DB
-        if center_id in existing_ids:
-            continue
-
-        try:
-            # Rate limiting - simple sleep
-            time.sleep(0.1)
+    # Resume an interrupted run where it stopped (instead of starting over
+    # with the ERROR rows whose backoff has expired in the meantime)
+    checkpoint = load_checkpoint()
+    if checkpoint["last_index"]:
+        print(f"Resuming interrupted run from input row {checkpoint['last_index']}")
+        todo = todo[todo.index >= checkpoint["last_index"]]
 
-            # API Call
-            response = gmaps.geocode(address, components={"country": country_filter})
-            status = "OK" if response else "ZERO_RESULTS"
-
-            # Save raw data
-            save_to_db(conn, center_id, address, response, status)
-            processed_count += 1
+    rows = list(
+        todo[["voting_center_id", "geo_query", "country_code"]].itertuples(
+            index=True, name=None
+        )
+    )
 
-        except Exception as e:
-            print(f"Error on {center_id}: {e}")
-            # Save error state so we don't retry endlessly
-            save_to_db(conn, center_id, address, [], "ERROR")
+    # 4. Fetch concurrently
+    processed_count = asyncio.run(
+        fetch_all(conn, rows, processed_count=checkpoint["processed_count"])
+    )
 
+    # Complete run: the next one starts from the top again
+    CHECKPOINT_FILE.unlink(missing_ok=True)
     conn.close()
     print(f"\nFetcher finished. New records added: {processed_count}")
 
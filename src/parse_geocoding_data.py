@@ -1,8 +1,13 @@
-import json
+import argparse
+import os
 import sqlite3
+from collections import OrderedDict, deque
+from multiprocessing import Pool
 from pathlib import Path
 
-import pandas as pd
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
 # --- CONFIGURATION ---
@@ -12,38 +17,110 @@ DB_FILE: Path = ROOT_DIR / "data" / "databases" / "google_geocoding.db"
 TABLE_NAME = "raw_responses"
 OUTPUT_FILE: Path = ROOT_DIR / "data" / "voting_centers_geocoded"
 
+# Address component types copied into their own column (in output order)
+_COMPONENT_DEFAULTS = {
+    "sublocality_level_1": None,
+    "locality": None,
+    "administrative_area_level_2": None,
+    "administrative_area_level_1": None,
+    "country": None,
+}
+TARGET_TYPES = frozenset(_COMPONENT_DEFAULTS)
 
-def parse_google_response(response_json):
+# Output schema, in column order
+SCHEMA = pa.schema(
+    [
+        ("voting_center_id", pa.string()),
+        ("geo_query", pa.string()),
+        ("geocoding_status", pa.string()),
+        ("lat", pa.float64()),
+        ("lng", pa.float64()),
+        ("place_id", pa.string()),
+        ("types", pa.list_(pa.string())),
+        ("formatted_address", pa.string()),
+        ("plus_code", pa.string()),
+        *[(field, pa.string()) for field in _COMPONENT_DEFAULTS],
+    ]
+)
+
+# Columns read straight from SQLite, in SELECT order
+SQL_COLUMNS = {
+    "voting_center_id": "center_id",
+    "geo_query": "geo_query",
+    "geocoding_status": "status",
+}
+_STATUS_INDEX = list(SQL_COLUMNS).index("geocoding_status")
+
+# Columns filled by parse_google_response, in the order of its tuple
+_PARSED_FIELDS = (
+    "lat",
+    "lng",
+    "place_id",
+    "types",
+    "formatted_address",
+    "plus_code",
+    *_COMPONENT_DEFAULTS,
+)
+_EMPTY_ROW = (None,) * len(_PARSED_FIELDS)
+
+# Low-cardinality columns stored dictionary-encoded (categorical in pandas)
+CATEGORICAL_COLUMNS = (
+    "geocoding_status",
+    "country",
+    "administrative_area_level_1",
+    "administrative_area_level_2",
+    "locality",
+)
+OUTPUT_SCHEMA = pa.schema(
+    [
+        pa.field(f.name, pa.dictionary(pa.int32(), f.type))
+        if f.name in CATEGORICAL_COLUMNS
+        else f
+        for f in SCHEMA
+    ]
+)
+
+ROW_GROUP_SIZE = 50_000  # Rows buffered before each Parquet write
+DEDUPE_CACHE_SIZE = 100_000  # Distinct responses remembered for deduplication
+
+
+def _scan_components(components):
     """
-    Extracts fields from the Google JSON list.
-    Accepts raw JSON (list of dicts) or parsed list.
+    Maps address components to the _COMPONENT_DEFAULTS fields.
+    Returns their long_name values as a tuple, in _COMPONENT_DEFAULTS order.
     """
-    # Ensure we have a list (if it came from DB as parsed JSON)
-    if isinstance(response_json, str):
-        response = json.loads(response_json)
-    else:
-        response = response_json
+    values = _COMPONENT_DEFAULTS.copy()
+    remaining = set(TARGET_TYPES)
 
-    if not response:
-        return {}
+    # Walk backwards keeping the first hit per type, which is the same as
+    # the last match winning, and stop once every type is found
+    for component in reversed(components):
+        matches = remaining.intersection(component.get("types", ()))
+        if matches:
+            long_name = component.get("long_name")
+            for field in matches:
+                values[field] = long_name
+            remaining -= matches
+            if not remaining:
+                break
 
-    result = response[0]
+    return tuple(values.values())
 
-    # 1. Basic Geometry & ID
-    data = {
-        "lat": result.get("geometry", {}).get("location", {}).get("lat"),
-        "lng": result.get("geometry", {}).get("location", {}).get("lng"),
-        "place_id": result.get("place_id"),
-        "types": json.dumps(result.get("types", [])),
-        "formatted_address": result.get("formatted_address"),
-    }
 
-    # 2. Extract Plus Code
+def _load_response(response_json):
+    """Ensure we have a list (if it came from DB as parsed JSON)."""
+    if isinstance(response_json, (str, bytes)):
+        return orjson.loads(response_json)
+    return response_json
+
+
+def _extract_plus_code(result):
+    """Plus code of a result (root plus_code, else address component)."""
     plus_code_value = None
 
     # Strategy A: Root
-    if "plus_code" in result:
-        pc = result["plus_code"]
+    pc = result.get("plus_code")
+    if pc is not None:
         if isinstance(pc, dict):
             plus_code_value = pc.get("global_code") or pc.get("compound_code")
         else:
@@ -51,75 +128,174 @@ def parse_google_response(response_json):
 
     # Strategy B: Address Components
     if not plus_code_value:
-        for component in result.get("address_components", []):
+        for component in result.get("address_components") or []:
             if "plus_code" in component.get("types", []):
                 plus_code_value = component.get("long_name")
                 break
 
-    data["plus_code"] = plus_code_value
+    return plus_code_value
 
-    # 3. Component Mapping
-    target_components = {
-        "sublocality_level_1": "sublocality_level_1",
-        "locality": "locality",
-        "administrative_area_level_2": "administrative_area_level_2",
-        "administrative_area_level_1": "administrative_area_level_1",
-        "country": "country",
-    }
 
-    # Initialize None
-    for field in target_components:
-        if field not in data:
-            data[field] = None
+def parse_google_response(response_json):
+    """
+    Extracts fields from the Google JSON list.
+    Accepts raw JSON (list of dicts) or parsed list.
+    Returns the _PARSED_FIELDS values as a tuple (all None for empty responses).
+    """
+    response = _load_response(response_json)
+    if not response:
+        return _EMPTY_ROW
+
+    result = response[0]
+    # Geometry and ID are read here, not with SQLite's json_extract: the blob
+    # is parsed anyway for the plus code and components
+    loc = (result.get("geometry") or {}).get("location") or {}
+    return (
+        loc.get("lat"),
+        loc.get("lng"),
+        result.get("place_id"),
+        result.get("types") or [],
+        result.get("formatted_address"),
+        _extract_plus_code(result),
+        *_scan_components(result.get("address_components") or []),
+    )
 
-    # Fill Matches
-    for component in result.get("address_components", []):
-        types = component.get("types", [])
-        for my_field, google_type in target_components.items():
-            if google_type in types:
-                data[my_field] = component.get("long_name")
 
-    return data
+def _types_to_json(types):
+    """CSV representation of the types list (empty cell for unparsed rows)."""
+    return orjson.dumps(types).decode() if isinstance(types, list) else None
 
 
-def run_parser():
-    conn = sqlite3.connect(DB_FILE)
+def _build_table(sql_rows, parsed_rows):
+    """
+    Builds the Arrow table for a batch of rows with the fixed OUTPUT_SCHEMA
+    (no type inference). sql_rows holds one tuple of SQL_COLUMNS values per
+    row, parsed_rows one parse_google_response tuple per row.
+    """
+    # Rows -> columns in one C-level pass (zip), then one Arrow array each
+    columns = zip(
+        [*SQL_COLUMNS, *_PARSED_FIELDS], [*zip(*sql_rows), *zip(*parsed_rows)]
+    )
+    arrays = {
+        name: pa.array(values, SCHEMA.field(name).type) for name, values in columns
+    }
+
+    table = pa.Table.from_arrays([arrays[name] for name in SCHEMA.names], schema=SCHEMA)
+    for name in CATEGORICAL_COLUMNS:
+        index = table.schema.get_field_index(name)
+        table = table.set_column(index, name, table.column(name).dictionary_encode())
+    return table
+
+
+def run_parser(write_csv=False):
+    # The Pool's task-feeder thread iterates the cursor (see responses() below)
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
 
-    # Read everything from DB
+    # Stream rows straight from the DB (no intermediate DataFrame of raw blobs)
     print("Reading data from database...")
-    query = f"SELECT center_id, geo_query, full_response, status FROM {TABLE_NAME}"
-    df_raw = pd.read_sql_query(query, conn)
-    conn.close()
+    total = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+    # full_response is cast to BLOB so it reaches the workers as raw UTF-8
+    # bytes (orjson parses bytes directly); the other columns stay str
+    cursor = conn.execute(
+        f"SELECT {', '.join(SQL_COLUMNS.values())}, "
+        f"CAST(full_response AS BLOB) FROM {TABLE_NAME}"
+    )
 
-    print(f"Parsing {len(df_raw)} records...")
+    print(f"Parsing {total} records...")
 
-    parsed_rows = []
+    # One (sql_values, key, is_duplicate) entry per row fed to the pool,
+    # popped by the consumer loop as the matching result comes back
+    pending = deque()
 
-    for _, row in tqdm(df_raw.iterrows(), total=df_raw.shape[0]):
-        # Base info from DB
-        row_data = {
-            "voting_center_id": row["center_id"],
-            "geo_query": row["geo_query"],
-            "geocoding_status": row["status"],
-        }
+    # Identical blobs (same query geocoded twice) are parsed only once, within
+    # an LRU window of DEDUPE_CACHE_SIZE responses. The feeder tracks keys and
+    # the consumer the parsed results; both apply the same LRU updates in the
+    # same row order, so a key the feeder finds is still cached downstream.
+    seen_keys: OrderedDict[int, None] = OrderedDict()
 
-        # Parse the JSON blob
-        extracted_data = parse_google_response(row["full_response"])
+    def responses():
+        for *values, full_response in cursor:
+            status = values[_STATUS_INDEX]
+            # ZERO_RESULTS / ERROR rows carry nothing to parse: send None so
+            # the worker returns _EMPTY_ROW without decoding JSON
+            if status != "OK":
+                pending.append((values, None, False))
+                yield None
+                continue
 
-        # Merge dicts
-        row_data.update(extracted_data)
-        parsed_rows.append(row_data)
+            key = hash(full_response)
+            duplicate = key in seen_keys
+            pending.append((values, key, duplicate))
+            if duplicate:
+                seen_keys.move_to_end(key)
+                yield None
+            else:
+                seen_keys[key] = None
+                if len(seen_keys) > DEDUPE_CACHE_SIZE:
+                    seen_keys.popitem(last=False)
+                yield full_response
 
-    # Create final DataFrame
-    final_df = pd.DataFrame(parsed_rows)
+    # parse_google_response is pure, so duplicates can share the first result
+    parsed_by_key: OrderedDict[int, tuple] = OrderedDict()
+    output_path = f"{OUTPUT_FILE}.parquet"
+    # Written next to the target and renamed at the end, so a failed run
+    # leaves the previous Parquet file in place
+    tmp_path = f"{output_path}.tmp"
 
-    # Save as CSV
-    final_df.to_csv(f"{OUTPUT_FILE}.csv", index=False)
-    print(f"Success! Parsed data saved to {OUTPUT_FILE}.csv")
+    # Parsing is pure CPU-bound Python: spread it over all cores.
+    # imap keeps the input order, so results line up with the pending rows,
+    # and row groups are written while later rows are still being parsed.
+    # Only the current row group is held in memory.
+    try:
+        writer = pq.ParquetWriter(tmp_path, OUTPUT_SCHEMA, compression="zstd")
+        with Pool() as pool, writer:
+            results = pool.imap(parse_google_response, responses(), chunksize=512)
+            sql_rows = []
+            batch = []
+            # Redraw at most twice a second / every 1000 rows, not on every row
+            progress = tqdm(results, total=total, mininterval=0.5, miniters=1000)
+            for parsed in progress:
+                values, key, duplicate = pending.popleft()
+                if duplicate:
+                    parsed = parsed_by_key[key]
+                    parsed_by_key.move_to_end(key)
+                elif key is not None:
+                    parsed_by_key[key] = parsed
+                    if len(parsed_by_key) > DEDUPE_CACHE_SIZE:
+                        parsed_by_key.popitem(last=False)
+                sql_rows.append(values)
+                batch.append(parsed)
 
-    final_df.to_parquet(f"{OUTPUT_FILE}.parquet", index=False)
-    print(f"Success! Parsed data saved to {OUTPUT_FILE}.parquet")
+                if len(batch) >= ROW_GROUP_SIZE:
+                    writer.write_table(_build_table(sql_rows, batch))
+                    sql_rows.clear()
+                    batch.clear()
+
+            if batch:
+                writer.write_table(_build_table(sql_rows, batch))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    finally:
+        conn.close()
+
+    print(f"Success! Parsed data saved to {output_path}")
+
+    if write_csv:
+        # No list type in CSV: types is written as a JSON string
+        table = pq.read_table(output_path)
+        csv_df = table.to_pandas()
+        csv_df["types"] = [_types_to_json(t) for t in table.column("types").to_pylist()]
+        csv_df.to_csv(f"{OUTPUT_FILE}.csv", index=False)
+        print(f"Success! Parsed data saved to {OUTPUT_FILE}.csv")
 
 
 if __name__ == "__main__":
-    run_parser()
+    parser = argparse.ArgumentParser(description="Parse raw Google geocodes.")
+    parser.add_argument(
+        "--csv", action="store_true", help="Also write a CSV next to the Parquet file"
+    )
+    args = parser.parse_args()
+
+    run_parser(write_csv=args.csv)